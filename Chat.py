@@ -3,167 +3,330 @@
 KomoChat Client - Terminal Chat Application
 Connect to server and chat with everyone
 """
-import socket
+import asyncio
+import collections
 import threading
 import sys
 import os
 import time
 
-# Colors for terminal
-class Colors:
-    GREEN = '\033[92m'
-    BLUE = '\033[94m'
-    RED = '\033[91m'
-    YELLOW = '\033[93m'
-    CYAN = '\033[96m'
-    PURPLE = '\033[95m'
-    BOLD = '\033[1m'
-    END = '\033[0m'
+from komochat_core import FRAME_HEADER, Colors, enable_ansi, tune_socket
+
+CONNECT_TIMEOUT = 5  # seconds before giving up on an unreachable server
+INBOX_SIZE = 1024  # Received messages not yet printed; when full, reading waits
+
+# Passed to asyncio.open_connection: race all resolved addresses and, on
+# Python 3.12+, report why each one failed instead of only the last error
+CONNECT_OPTIONS = {'happy_eyeballs_delay': 0.25}
+if sys.version_info >= (3, 12):
+    CONNECT_OPTIONS['all_errors'] = True
+
+# Pre-rendered UI strings
+_BANNER = (f"{Colors.CYAN}{'═'*50}\n"
+           f"     {Colors.BOLD}KOMOCHAT - TERMINAL CHAT CLIENT{Colors.END}{Colors.CYAN}\n"
+           f"{'═'*50}{Colors.END}\n\n"
+           f"{Colors.YELLOW}Enter Server Information{Colors.END}\n"
+           f"{Colors.CYAN}Someone must run 'server.py' first{Colors.END}\n\n")
+_HEADER = (f"{Colors.PURPLE}{'━'*60}\n"
+           f"                   {Colors.BOLD}KOMOCHAT TERMINAL{Colors.END}{Colors.PURPLE}\n"
+           f"{'━'*60}{Colors.END}\n\n")
+_CHAT_HINT = (f"{Colors.YELLOW}Type your messages below\n"
+              f"Type '/exit' to quit\n"
+              f"{Colors.PURPLE}{'─'*60}{Colors.END}\n\n")
+_PROMPT = f"{Colors.BLUE}You: {Colors.END}"
+_HELP_TEXT = (f"\n{Colors.CYAN}Commands:{Colors.END}\n"
+              f"{Colors.GREEN}/exit{Colors.END} - Quit chat\n"
+              f"{Colors.GREEN}/clear{Colors.END} - Clear screen\n"
+              f"{Colors.GREEN}/users{Colors.END} - Show online users\n"
+              f"{Colors.GREEN}/nick{Colors.END} - Change nickname\n")
+_CLEAR_LINE = "\r\033[2K"  # Erase the half-typed prompt line
+_RX_LINE = Colors.CYAN + "%s" + Colors.END + "\n"
 
 def clear_screen():
     """Clear terminal screen"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if not sys.stdout.isatty():
+        return  # Don't put escape codes into a pipe or log file
+    sys.stdout.write('\033[2J\033[H')
+    sys.stdout.flush()
 
-def print_header():
-    """Print chat header"""
-    print(f"{Colors.PURPLE}{'━'*60}")
-    print(f"                   {Colors.BOLD}KOMOCHAT TERMINAL{Colors.END}{Colors.PURPLE}")
-    print(f"{'━'*60}{Colors.END}\n")
+def print_header(nickname, footer="\n"):
+    """Print chat header and who we are, in one write"""
+    sys.stdout.write(f"{_HEADER}{Colors.GREEN}Connected as: {nickname}{Colors.END}\n{footer}")
+    sys.stdout.flush()
 
 class ChatClient:
     def __init__(self):
-        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.reader = None
+        self.writer = None
+        self._write = None  # Bound writer.writelines, set once connected
         self.nickname = ""
         self.running = True
+        self.disconnected = asyncio.Event()  # Set when the server goes away
+        self.inbox = asyncio.Queue(INBOX_SIZE)  # Received, not yet printed
+        self._stdin_buf = b""  # Partial line read from stdin
+        self._stdin_lines = collections.deque()  # Complete lines not yet consumed
+        
+    def read_stdin(self, prompt):
+        """Read one line from stdin, returned as a future"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        if self._stdin_lines:
+            # Left over from a multi-line paste
+            future.set_result(self._stdin_lines.popleft())
+            return future
+        
+        if sys.stdin.isatty():
+            try:
+                # Let the event loop's selector wake us when stdin is readable
+                fd = sys.stdin.fileno()
+                loop.add_reader(fd, self._on_stdin, fd, future)
+                future.add_done_callback(lambda _: loop.remove_reader(fd))
+                return future
+            except (NotImplementedError, OSError):
+                pass  # Windows consoles can't be selected on
+        
+        # Pipes may hold lines already buffered by input(); read via sys.stdin
+        self._read_stdin_thread(loop, future)
+        return future
+    
+    def _on_stdin(self, fd, future):
+        """Collect stdin bytes and hand the first complete line to future"""
+        data = os.read(fd, 4096)
+        if not data:
+            # EOF: flush a trailing partial line, else behave like input()
+            if self._stdin_buf:
+                self._stdin_lines.append(self._stdin_buf.decode('utf-8', 'replace'))
+                self._stdin_buf = b""
+            elif not future.done():
+                future.set_exception(EOFError())
+        else:
+            *lines, self._stdin_buf = (self._stdin_buf + data).split(b"\n")
+            self._stdin_lines.extend(line.decode('utf-8', 'replace') for line in lines)
         
-    def connect(self, host, port=9999):
+        if self._stdin_lines and not future.done():
+            future.set_result(self._stdin_lines.popleft())
+    
+    def _read_stdin_thread(self, loop, future):
+        """Fallback: block in readline() on a daemon thread"""
+        def deliver(line, error):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(line)
+        
+        def worker():
+            try:
+                line = sys.stdin.readline()
+                error = None if line else EOFError()
+            except Exception as e:
+                line, error = None, e
+            try:
+                loop.call_soon_threadsafe(deliver, line, error)
+            except RuntimeError:
+                pass  # Chat already finished, nobody is waiting
+        
+        # Daemon thread so a pending read never holds the process open
+        threading.Thread(target=worker, daemon=True).start()
+    
+    async def read_line(self, prompt):
+        """Wait for a line of input, or return None once disconnected"""
+        line = self.read_stdin(prompt)
+        closed = asyncio.ensure_future(self.disconnected.wait())
+        try:
+            await asyncio.wait({line, closed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed.cancel()
+        if not line.done():
+            line.cancel()
+            return None
+        return line.result()
+    
+    async def connect(self, host, port=9999):
         """Connect to chat server"""
         try:
             print(f"{Colors.YELLOW}Connecting to {host}:{port}...{Colors.END}")
-            self.client.connect((host, port))
-            
-            # Get nickname
-            self.nickname = input(f"{Colors.YELLOW}Enter your nickname: {Colors.END}").strip()
-            if not self.nickname:
-                self.nickname = "Anonymous"
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, **CONNECT_OPTIONS),
+                CONNECT_TIMEOUT)
+            self._write = self.writer.writelines
+            tune_socket(self.writer.get_extra_info('socket'))
             
-            # Send nickname to server
-            self.client.send(self.nickname.encode('utf-8'))
+            # Server asks for a nickname first; it was entered before
+            # connecting, so the server's handshake timeout never includes
+            # typing time
+            await self.read_frame()
+            self.send_message(self.nickname)
             
             # Receive welcome message
-            welcome = self.client.recv(1024).decode('utf-8')
+            welcome = await self.read_frame()
             print(f"{Colors.GREEN}{welcome}{Colors.END}")
             
             return True
             
-        except ConnectionRefusedError:
-            print(f"{Colors.RED}❌ Cannot connect to server!{Colors.END}")
-            print(f"{Colors.YELLOW}Make sure server is running on {host}:{port}{Colors.END}")
+        except asyncio.TimeoutError:
+            sys.stdout.write(f"{Colors.RED}❌ Server did not answer within {CONNECT_TIMEOUT}s{Colors.END}\n"
+                             f"{Colors.YELLOW}Check the IP address and that {host}:{port} is reachable{Colors.END}\n")
             return False
         except Exception as e:
-            print(f"{Colors.RED}Connection error: {e}{Colors.END}")
+            # all_errors raises a group holding one error per address tried
+            errors = getattr(e, 'exceptions', [e])
+            if all(isinstance(error, ConnectionRefusedError) for error in errors):
+                sys.stdout.write(f"{Colors.RED}❌ Cannot connect to server!{Colors.END}\n"
+                                 f"{Colors.YELLOW}Make sure server is running on {host}:{port}{Colors.END}\n")
+            else:
+                sys.stdout.write("".join(f"{Colors.RED}Connection error: {error}{Colors.END}\n"
+                                         for error in errors))
             return False
     
-    def receive_messages(self):
-        """Receive messages from server"""
+    async def receive_messages(self):
+        """Receive messages from server into the inbox"""
         while self.running:
             try:
-                message = self.client.recv(1024).decode('utf-8')
-                if message:
-                    # Don't print if it's our own message
-                    if not message.startswith(f"[{self.nickname}]:"):
-                        print(f"\r{Colors.CYAN}{message}{Colors.END}")
-                        print(f"{Colors.BLUE}You: {Colors.END}", end="", flush=True)
-            except:
-                print(f"\n{Colors.RED}❌ Lost connection to server{Colors.END}")
-                self.running = False
+                message = await self.read_frame()
+            except (OSError, EOFError, UnicodeDecodeError):
+                message = None
+            
+            # None tells render_messages the connection is gone. A full
+            # inbox makes us wait here, and TCP then slows the server down,
+            # so a burst is delayed rather than lost
+            await self.inbox.put(message)
+            if message is None:
                 break
     
+    async def render_messages(self):
+        """Print inbox messages, everything queued so far in one write"""
+        while True:
+            batch = [await self.inbox.get()]
+            while not self.inbox.empty():
+                batch.append(self.inbox.get_nowait())
+            
+            # Don't print our own messages
+            own = f"[{self.nickname}]:"
+            lines = [_RX_LINE % message for message in batch
+                     if message is not None and not message.startswith(own)]
+            if lines:
+                # Erase prompt, print, redraw prompt
+                sys.stdout.write(_CLEAR_LINE + "".join(lines) + _PROMPT)
+                sys.stdout.flush()
+            
+            if None in batch:
+                sys.stdout.write(f"{_CLEAR_LINE}{Colors.RED}❌ Lost connection to server{Colors.END}\n")
+                sys.stdout.flush()
+                self.running = False
+                self.disconnected.set()
+                return
+    
+    async def read_frame(self):
+        """Read one length-prefixed message from the server"""
+        size, = FRAME_HEADER.unpack(await self.reader.readexactly(FRAME_HEADER.size))
+        return (await self.reader.readexactly(size)).decode('utf-8')
+    
     def send_message(self, message):
         """Send message to server"""
         try:
-            self.client.send(message.encode('utf-8'))
+            data = message.encode('utf-8')
+            self._write((FRAME_HEADER.pack(len(data)), data))
             return True
-        except:
+        except (OSError, UnicodeEncodeError):
             return False
     
-    def start_chat(self):
+    async def cmd_exit(self):
+        """/exit - Quit chat"""
+        print(f"{Colors.YELLOW}Disconnecting...{Colors.END}")
+        self.running = False
+    
+    async def cmd_clear(self):
+        """/clear - Clear screen"""
+        clear_screen()
+        print_header(self.nickname)
+    
+    async def cmd_help(self):
+        """/help - List commands"""
+        sys.stdout.write(_HELP_TEXT)
+    
+    async def cmd_users(self):
+        """/users - Show online users"""
+        self.send_message("/users")
+    
+    async def cmd_nick(self):
+        """/nick - Change nickname"""
+        new_nick = await self.read_line(f"{Colors.YELLOW}New nickname: {Colors.END}")
+        if not new_nick or not new_nick.strip():
+            return
+        new_nick = new_nick.strip()
+        self.send_message(f"/nick {new_nick}")
+        self.nickname = new_nick
+        print(f"{Colors.GREEN}Nickname changed to {new_nick}{Colors.END}")
+    
+    COMMANDS = {
+        '/exit': cmd_exit,
+        '/clear': cmd_clear,
+        '/help': cmd_help,
+        '/users': cmd_users,
+        '/nick': cmd_nick,
+    }
+    
+    async def start_chat(self):
         """Start the chat interface"""
         clear_screen()
-        print_header()
+        print_header(self.nickname, _CHAT_HINT)
         
-        print(f"{Colors.GREEN}Connected as: {self.nickname}{Colors.END}")
-        print(f"{Colors.YELLOW}Type your messages below")
-        print(f"Type '/exit' to quit")
-        print(f"{Colors.PURPLE}{'─'*60}{Colors.END}\n")
+        # Receive concurrently with the input loop below
+        receive_task = asyncio.create_task(self.receive_messages())
+        render_task = asyncio.create_task(self.render_messages())
         
-        # Start receiving thread
-        receive_thread = threading.Thread(target=self.receive_messages)
-        receive_thread.daemon = True
-        receive_thread.start()
-        
-        while self.running:
-            try:
-                # Print prompt
-                message = input(f"{Colors.BLUE}You: {Colors.END}").strip()
-                
-                if message.lower() == '/exit':
-                    print(f"{Colors.YELLOW}Disconnecting...{Colors.END}")
+        try:
+            while self.running:
+                try:
+                    # Print prompt (stdin is read off the event loop)
+                    message = await self.read_line(_PROMPT)
+                    if message is None:
+                        # Lost the server while waiting for input
+                        break
+                    message = message.strip()
+                    
+                    handler = self.COMMANDS.get(message.lower())
+                    if handler:
+                        await handler(self)
+                        continue
+                    
+                    if message:  # Don't send empty messages
+                        if not self.send_message(message):
+                            print(f"{Colors.RED}Failed to send message{Colors.END}")
+                            break
+                            
+                except EOFError:
+                    print(f"\n{Colors.YELLOW}Disconnecting...{Colors.END}")
                     self.running = False
                     break
-                elif message.lower() == '/clear':
-                    clear_screen()
-                    print_header()
-                    print(f"{Colors.GREEN}Connected as: {self.nickname}{Colors.END}\n")
-                    continue
-                elif message.lower() == '/help':
-                    print(f"\n{Colors.CYAN}Commands:{Colors.END}")
-                    print(f"{Colors.GREEN}/exit{Colors.END} - Quit chat")
-                    print(f"{Colors.GREEN}/clear{Colors.END} - Clear screen")
-                    print(f"{Colors.GREEN}/users{Colors.END} - Show online users")
-                    print(f"{Colors.GREEN}/nick{Colors.END} - Change nickname")
-                    continue
-                elif message.lower() == '/users':
-                    self.send_message("/users")
-                    continue
-                elif message.lower() == '/nick':
-                    new_nick = input(f"{Colors.YELLOW}New nickname: {Colors.END}").strip()
-                    if new_nick:
-                        self.send_message(f"/nick {new_nick}")
-                        self.nickname = new_nick
-                        print(f"{Colors.GREEN}Nickname changed to {new_nick}{Colors.END}")
-                    continue
-                
-                if message:  # Don't send empty messages
-                    if not self.send_message(message):
-                        print(f"{Colors.RED}Failed to send message{Colors.END}")
-                        break
-                        
-            except KeyboardInterrupt:
-                print(f"\n{Colors.YELLOW}Disconnecting...{Colors.END}")
-                self.running = False
-                break
-            except EOFError:
-                print(f"\n{Colors.YELLOW}Disconnecting...{Colors.END}")
-                self.running = False
-                break
+        finally:
+            # Also runs when Ctrl-C cancels us; main() reports that
+            receive_task.cancel()
+            render_task.cancel()
+            self.writer.close()
         
-        # Cleanup
         try:
-            self.client.close()
-        except:
+            await self.writer.wait_closed()
+        except OSError:
             pass
+    
+    async def run(self, host, port=9999, nickname=""):
+        """Connect to the server and chat until disconnected"""
+        self.nickname = nickname.strip() or "Anonymous"
+        if await self.connect(host, port):
+            await self.start_chat()
 
 def main():
+    enable_ansi()
     clear_screen()
-    print(f"{Colors.CYAN}{'═'*50}")
-    print(f"     {Colors.BOLD}KOMOCHAT - TERMINAL CHAT CLIENT{Colors.END}{Colors.CYAN}")
-    print(f"{'═'*50}{Colors.END}\n")
+    sys.stdout.write(_BANNER)
     
     # Get server info
-    print(f"{Colors.YELLOW}Enter Server Information{Colors.END}")
-    print(f"{Colors.CYAN}Someone must run 'server.py' first{Colors.END}\n")
-    
     host = input(f"{Colors.YELLOW}Server IP address: {Colors.END}").strip()
     if not host:
         print(f"{Colors.RED}IP address required!{Colors.END}")
@@ -175,13 +338,17 @@ def main():
     else:
         try:
             port = int(port)
-        except:
+        except ValueError:
             port = 9999
     
-    # Create client and connect
-    client = ChatClient()
-    if client.connect(host, port):
-        client.start_chat()
+    try:
+        nickname = input(f"{Colors.YELLOW}Enter your nickname: {Colors.END}")
+        
+        # Create client and connect
+        client = ChatClient()
+        asyncio.run(client.run(host, port, nickname))
+    except KeyboardInterrupt:
+        print(f"\n{Colors.YELLOW}Disconnecting...{Colors.END}")
     
     print(f"\n{Colors.YELLOW}Press Enter to exit...{Colors.END}")
     input()
@@ -0,0 +1,69 @@
+"""
+KomoChat Core - Pieces shared by the client (Chat.py) and server.py
+Keep this file next to both scripts
+"""
+import os
+import socket
+import struct
+
+FRAME_HEADER = struct.Struct('>I')  # Length prefix in front of every message
+MAX_FRAME = 64 * 1024  # Largest message accepted from a peer
+
+# Colors for terminal
+class Colors:
+    GREEN = '\033[92m'
+    BLUE = '\033[94m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    CYAN = '\033[96m'
+    PURPLE = '\033[95m'
+    BOLD = '\033[1m'
+    END = '\033[0m'
+
+def enable_ansi():
+    """Turn on ANSI escape handling in Windows consoles"""
+    if os.name != 'nt':
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_ulong()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+            kernel32.SetConsoleMode(handle, mode.value | 0x0004)
+    except (AttributeError, OSError):
+        pass
+
+# Applied by tune_socket to every chat connection
+SOCKET_OPTIONS = [
+    # Send each message right away instead of letting Nagle coalesce them
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    # Notice a silently dead peer in about a minute, not the 2 hour default
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+if hasattr(socket, 'TCP_KEEPIDLE'):
+    SOCKET_OPTIONS += [
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3),
+    ]
+if hasattr(socket, 'TCP_NOTSENT_LOWAT'):
+    # Cap unsent data queued in the kernel so new messages aren't stuck
+    # behind a backlog. SO_SNDBUF/SO_RCVBUF are deliberately left unset:
+    # fixing them would switch off the kernel's buffer autotuning.
+    SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, 16 * 1024))
+if hasattr(socket, 'IP_TOS'):
+    # IPTOS_LOWDELAY: ask routers to favour latency over throughput
+    SOCKET_OPTIONS.append((socket.IPPROTO_IP, socket.IP_TOS, 0x10))
+
+def tune_socket(sock):
+    """Set socket options for small, latency-sensitive chat messages
+
+    Each option is best-effort: one the platform or address family
+    rejects is skipped, never fatal to the connection."""
+    for level, option, value in SOCKET_OPTIONS:
+        try:
+            sock.setsockopt(level, option, value)
+        except OSError:
+            pass  # Not supported here
@@ -3,21 +3,51 @@
 KomoChat Server - Run this FIRST on any computer
 Acts as the middleman for all chats
 """
+import asyncio
+import functools
+import ipaddress
+import queue
 import socket
-import threading
-import time
 import sys
+import threading
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+try:
+    import uvloop  # Optional: libuv event loop, cheaper per send (pip install uvloop)
+except ImportError:
+    uvloop = None
 
-# Colors for terminal
-class Colors:
-    GREEN = '\033[92m'
-    BLUE = '\033[94m'
-    RED = '\033[91m'
-    YELLOW = '\033[93m'
-    CYAN = '\033[96m'
-    BOLD = '\033[1m'
-    END = '\033[0m'
+from komochat_core import FRAME_HEADER, MAX_FRAME, Colors, enable_ansi, tune_socket
 
+NICK_REQUEST = b"NICK"  # Sent to each new client to ask for its nickname
+HANDSHAKE_TIMEOUT = 30  # seconds a new client gets to send its nickname
+LOG_BATCH = 64  # Most log lines the logger thread joins into one write
+SEND_LIMIT = 1024 * 1024  # Unsent bytes a client may pile up before it is dropped
+BACKLOG = 4096  # Pending connections the kernel may queue (capped at somaxconn)
+
+# Pre-rendered UI strings
+_BANNER = (f"{Colors.CYAN}{'═'*50}\n"
+           f"     {Colors.BOLD}KOMOCHAT - TERMINAL CHAT SERVER{Colors.END}{Colors.CYAN}\n"
+           f"{'═'*50}{Colors.END}\n")
+_STARTED_BANNER = (f"{Colors.CYAN}{'═'*50}\n"
+                   f"     {Colors.BOLD}KOMOCHAT SERVER STARTED!{Colors.END}{Colors.CYAN}\n"
+                   f"{'═'*50}{Colors.END}\n")
+_SHARE_HINT = (f"\n{Colors.YELLOW}Share this IP with your friends!\n"
+               f"They need to connect to this IP{Colors.END}\n\n")
+_LAN_HINT = (f"{Colors.YELLOW}This is a local network address - friends outside\n"
+             f"your network need port {{port}} forwarded to it{Colors.END}\n\n")
+
+# Log line templates, filled in on the logger thread
+_CONNECTED_LINE = Colors.GREEN + "✓ New connection from %s" + Colors.END + "\n"
+_JOINED_LINE = Colors.CYAN + "✓ %s joined as '%s'" + Colors.END + "\n"
+_MESSAGE_LINE = Colors.CYAN + "[%s]: %s" + Colors.END + "\n"
+_LEFT_LINE = Colors.YELLOW + "✗ %s disconnected" + Colors.END + "\n"
+
+@functools.lru_cache(maxsize=1)
 def get_local_ip():
     """Get the server's IP address"""
     try:
@@ -26,127 +56,208 @@ def get_local_ip():
         ip = s.getsockname()[0]
         s.close()
         return ip
-    except:
+    except OSError:
         return "127.0.0.1"
 
+_log_queue = queue.SimpleQueue()
+
+def log(template, *args):
+    """Queue a line for the logger thread, so terminal output never
+    blocks the event loop. Formatting happens on that thread too"""
+    _log_queue.put_nowait((template, args))
+
+def write_log():
+    """Logger thread: write queued lines, up to LOG_BATCH per write"""
+    while True:
+        entries = [_log_queue.get()]
+        while len(entries) < LOG_BATCH:
+            try:
+                entries.append(_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            sys.stdout.write("".join(template % args for template, args in entries))
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            pass  # Unprintable nickname or closed stdout; keep draining the queue
+
+def raise_fd_limit():
+    """Lift the open-file soft limit as far as allowed, since every client
+    holds one descriptor. Returns the limit in effect, or None on Windows"""
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    # Some systems refuse an unlimited soft limit, so aim for a large one
+    target = hard if hard != resource.RLIM_INFINITY else 1024 * 1024
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass  # Keep the default limit
+    return soft
+
+def send_frame(writer, data):
+    """Queue one length-prefixed message on a client's transport"""
+    writer.writelines((FRAME_HEADER.pack(len(data)), data))
+
+async def read_frame(reader):
+    """Read one length-prefixed message, raising EOFError if the peer closed"""
+    header = await reader.readexactly(FRAME_HEADER.size)
+    size, = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ValueError(f"Message too large ({size} bytes)")
+    return await reader.readexactly(size)
+
 class ChatServer:
     def __init__(self, host='0.0.0.0', port=9999):
         self.host = host
         self.port = port
-        self.clients = []  # List of connected clients
-        self.nicknames = []  # List of client nicknames
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.clients = {}  # StreamWriter -> nickname, for connected clients
+        self.outbox = {}  # StreamWriter -> buffers to write at the end of this loop pass
+        self.server = None
         
-    def start(self):
+    async def start(self):
         """Start the chat server"""
+        fd_limit = raise_fd_limit()
         try:
-            self.server.bind((self.host, self.port))
-            self.server.listen()
+            if self.host == '0.0.0.0' and socket.has_dualstack_ipv6():
+                # One socket that takes both IPv6 and IPv4 clients
+                sock = socket.create_server(
+                    ('::', self.port), family=socket.AF_INET6, dualstack_ipv6=True)
+                self.server = await asyncio.start_server(
+                    self.handle_client, sock=sock, backlog=BACKLOG)
+            else:
+                self.server = await asyncio.start_server(
+                    self.handle_client, self.host, self.port, backlog=BACKLOG)
             
             local_ip = get_local_ip()
             
-            print(f"{Colors.CYAN}{'═'*50}")
-            print(f"     {Colors.BOLD}KOMOCHAT SERVER STARTED!{Colors.END}{Colors.CYAN}")
-            print(f"{'═'*50}{Colors.END}")
-            print(f"{Colors.GREEN}✓ Server IP: {local_ip}")
-            print(f"✓ Port: {self.port}")
-            print(f"✓ Status: Waiting for connections...{Colors.END}")
-            print(f"\n{Colors.YELLOW}Share this IP with your friends!")
-            print("They need to connect to this IP{Colors.END}\n")
-            
-            # Start accepting connections
-            self.accept_connections()
+            # Build the whole start screen, then draw it with one write
+            screen = [_STARTED_BANNER,
+                      f"{Colors.GREEN}✓ Server IP: {local_ip}\n"
+                      f"✓ Port: {self.port}\n"
+                      f"✓ Status: Waiting for connections...{Colors.END}\n",
+                      _SHARE_HINT]
+            if fd_limit is not None:
+                screen.insert(2, f"{Colors.GREEN}✓ Open file limit: {fd_limit}{Colors.END}\n")
+            # is_private covers 10/8, 172.16/12, 192.168/16, link-local and
+            # IPv6 private ranges, but also loopback: the 127.0.0.1 fallback
+            # when offline needs no port-forwarding advice
+            ip = ipaddress.ip_address(local_ip)
+            if ip.is_private and not ip.is_loopback:
+                screen.append(_LAN_HINT.format(port=self.port))
+            sys.stdout.write("".join(screen))
+            sys.stdout.flush()
             
         except Exception as e:
             print(f"{Colors.RED}Error starting server: {e}{Colors.END}")
             input("Press Enter to exit...")
+            return
+        
+        threading.Thread(target=write_log, daemon=True).start()
+        
+        # Accept connections until interrupted
+        async with self.server:
+            await self.server.serve_forever()
     
-    def accept_connections(self):
-        """Accept incoming client connections"""
-        while True:
-            try:
-                client, address = self.server.accept()
-                print(f"{Colors.GREEN}✓ New connection from {address[0]}{Colors.END}")
-                
-                # Ask for nickname
-                client.send("NICK".encode('utf-8'))
-                nickname = client.recv(1024).decode('utf-8')
-                
-                self.clients.append(client)
-                self.nicknames.append(nickname)
-                
-                print(f"{Colors.CYAN}✓ {address[0]} joined as '{nickname}'{Colors.END}")
-                
-                # Send welcome message
-                client.send(f"Connected to KomoChat Server!\nUsers online: {len(self.clients)}".encode('utf-8'))
-                
-                # Broadcast new user joined
-                self.broadcast(f"🎉 {nickname} joined the chat!", client)
-                
-                # Start thread for this client
-                thread = threading.Thread(target=self.handle_client, args=(client,))
-                thread.start()
-                
-            except Exception as e:
-                print(f"{Colors.RED}Connection error: {e}{Colors.END}")
-                break
-    
-    def broadcast(self, message, sender_client=None):
-        """Send message to all connected clients"""
-        for client in self.clients:
-            try:
-                if client != sender_client:  # Don't send to sender
-                    client.send(message.encode('utf-8'))
-            except:
-                # Remove disconnected client
-                self.remove_client(client)
-    
-    def handle_client(self, client):
-        """Handle messages from a client"""
-        while True:
-            try:
-                message = client.recv(1024).decode('utf-8')
-                
-                if not message:
-                    # Client disconnected
-                    self.remove_client(client)
-                    break
-                
-                # Get client index
-                index = self.clients.index(client)
-                nickname = self.nicknames[index]
+    async def handle_client(self, reader, writer):
+        """Handle one client from nickname handshake until it disconnects"""
+        tune_socket(writer.get_extra_info('socket'))
+        # IPv4 clients show up as ::ffff:a.b.c.d on the dual-stack socket
+        # peername is None if the client reset before we got here
+        peer = (writer.get_extra_info('peername') or ('?',))[0].removeprefix('::ffff:')
+        log(_CONNECTED_LINE, peer)
+        
+        # Ask for nickname
+        try:
+            send_frame(writer, NICK_REQUEST)
+            nickname = await asyncio.wait_for(read_frame(reader), HANDSHAKE_TIMEOUT)
+            nickname = nickname.decode('utf-8')
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+            # Left, stalled or misbehaved before picking a nickname
+            writer.close()
+            return
+        
+        self.clients[writer] = nickname
+        
+        log(_JOINED_LINE, peer, nickname)
+        
+        # Send welcome message
+        send_frame(writer, f"Connected to KomoChat Server!\nUsers online: {len(self.clients)}".encode('utf-8'))
+        
+        # Broadcast new user joined
+        self.broadcast(f"🎉 {nickname} joined the chat!", writer)
+        
+        try:
+            while True:
+                message = (await read_frame(reader)).decode('utf-8')
                 
-                print(f"{Colors.CYAN}[{nickname}]: {message}{Colors.END}")
+                log(_MESSAGE_LINE, nickname, message)
                 
                 # Broadcast message to all other clients
                 broadcast_msg = f"[{nickname}]: {message}"
-                self.broadcast(broadcast_msg, client)
+                self.broadcast(broadcast_msg, writer)
                 
-            except:
+        except (OSError, EOFError, ValueError):
+            # Connection dropped, or an oversized or non-UTF-8 message
+            pass
+        finally:
+            self.remove_client(writer)
+    
+    def broadcast(self, message, sender=None):
+        """Send message to all connected clients
+        
+        Never waits on a recipient: the sender's read loop must not stall
+        because someone else stopped reading. A client whose unsent data
+        passes SEND_LIMIT is dropped instead."""
+        data = message.encode('utf-8')
+        # Encode and frame once; every recipient gets the same two buffers
+        frame = (FRAME_HEADER.pack(len(data)), data)
+        for client in list(self.clients):
+            if client is sender:  # Don't send to sender
+                continue
+            if client.transport.get_write_buffer_size() > SEND_LIMIT:
+                # Not reading (suspended, Ctrl-S, dead link). Discard what is
+                # queued for it rather than wait for a flush that never comes
+                client.transport.abort()
                 self.remove_client(client)
-                break
+                continue
+            self.queue_frame(client, frame)
     
-    def remove_client(self, client):
+    def queue_frame(self, writer, frame):
+        """Hold a frame for the client until the end of this event loop pass
+        
+        Messages from several senders that land in the same pass then go
+        to each client in one write instead of one write apiece."""
+        if not self.outbox:
+            asyncio.get_running_loop().call_soon(self.flush_outbox)
+        self.outbox.setdefault(writer, []).extend(frame)
+    
+    def flush_outbox(self):
+        """Write every client's held frames in one go"""
+        outbox, self.outbox = self.outbox, {}
+        for writer, buffers in outbox.items():
+            if not writer.is_closing():
+                writer.writelines(buffers)
+    
+    def remove_client(self, writer):
         """Remove a disconnected client"""
-        if client in self.clients:
-            index = self.clients.index(client)
-            nickname = self.nicknames[index]
-            
-            self.clients.remove(client)
-            self.nicknames.remove(nickname)
-            
-            client.close()
-            
-            print(f"{Colors.YELLOW}✗ {nickname} disconnected{Colors.END}")
-            
-            # Broadcast user left
-            self.broadcast(f"👋 {nickname} left the chat")
+        nickname = self.clients.pop(writer, None)
+        if nickname is None:
+            return
+        
+        # Also ends that client's read loop if it is still waiting
+        writer.close()
+        
+        log(_LEFT_LINE, nickname)
+        
+        # Broadcast user left
+        self.broadcast(f"👋 {nickname} left the chat")
 
 def main():
-    print(f"{Colors.CYAN}{'═'*50}")
-    print(f"     {Colors.BOLD}KOMOCHAT - TERMINAL CHAT SERVER{Colors.END}{Colors.CYAN}")
-    print(f"{'═'*50}{Colors.END}")
+    enable_ansi()
+    sys.stdout.write(_BANNER)
     
     # Get port
     port = input(f"{Colors.YELLOW}Enter port [9999]: {Colors.END}").strip()
@@ -155,12 +266,19 @@ def main():
     else:
         try:
             port = int(port)
-        except:
+        except ValueError:
             port = 9999
     
     # Start server
     server = ChatServer(port=port)
-    server.start()
+    # uvloop.run only exists in uvloop 0.18+; older releases get the policy
+    run = getattr(uvloop, 'run', None) or asyncio.run
+    if uvloop and run is asyncio.run:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    try:
+        run(server.start())
+    except KeyboardInterrupt:
+        print(f"\n{Colors.YELLOW}Server stopped{Colors.END}")
 
 if __name__ == "__main__":
     main()